@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Micro benchmarks for `filtered_logger` and `encrypt_password` modules
+"""
+import bcrypt
+import re
+import time
+import timeit
+from typing import List
+
+from encrypt_password import HashingExecutor, is_valid
+from filtered_logger import (
+    PII_FIELDS, StructuredRedactor, filter_datum, get_redactor
+)
+
+
+MESSAGE = ("name=egg;email=eggmin@eggsample.com;phone=555-0100;"
+           "ssn=000-00-0000;password=eggcellent;ip=127.0.0.1;"
+           "last_login=2019-11-14T06:16:24;user_agent=Mozilla/5.0;")
+
+
+def regex_filter_datum(
+        fields: List[str],
+        redaction: str,
+        message: str,
+        separator: str
+        ) -> str:
+    """Return log message obfuscated the way `filter_datum` used to"""
+    return re.sub(
+            r'({})=(.*?){}'.format('|'.join(fields), separator),
+            r'\1={}'.format(redaction), message
+        )
+
+
+def bench_redaction(number: int = 100000) -> None:
+    """Compare per call regex building against a compiled `Redactor`"""
+    fields = list(PII_FIELDS)
+    redactor = get_redactor(PII_FIELDS, "***", ";")
+    assert redactor.redact(MESSAGE) == regex_filter_datum(
+        fields, "***", MESSAGE, ";"
+    )
+    runs = {
+        "re.sub per call": lambda: regex_filter_datum(
+            fields, "***", MESSAGE, ";"
+        ),
+        "filter_datum": lambda: filter_datum(fields, "***", MESSAGE, ";"),
+        "Redactor.redact": lambda: redactor.redact(MESSAGE),
+    }
+    for name, run in runs.items():
+        secs = timeit.timeit(run, number=number)
+        print("{:<20} {:>8.0f} ns/msg".format(name, secs / number * 1e9))
+
+
+def bench_structured(number: int = 20000) -> None:
+    """Compare render-then-regex with key based redaction on row widths"""
+    redactor = get_redactor(PII_FIELDS, "***", ";")
+    for width in (8, 24, 64):
+        columns = list(PII_FIELDS) + [
+            "col_{}".format(i) for i in range(width - len(PII_FIELDS))
+        ]
+        row = tuple("value_{}".format(i) for i in range(width))
+        plain = StructuredRedactor(tuple(columns), ())
+        structured = StructuredRedactor(tuple(columns))
+        assert redactor.redact(plain.render(row)) == structured.render(row)
+        runs = {
+            "format + regex": lambda: redactor.redact(plain.render(row)),
+            "structured": lambda: structured.render(row),
+        }
+        for name, run in runs.items():
+            secs = timeit.timeit(run, number=number)
+            print("{:>3} cols {:<16} {:>8.0f} ns/row".format(
+                width, name, secs / number * 1e9
+            ))
+
+
+def bench_hashing(calls: int = 64, rounds: int = 8) -> None:
+    """Measure `is_valid` throughput on `HashingExecutor` worker counts"""
+    hashed = bcrypt.hashpw(b"eggcellent", bcrypt.gensalt(rounds))
+    start = time.perf_counter()
+    for _ in range(calls):
+        is_valid(hashed, "eggcellent")
+    secs = time.perf_counter() - start
+    print("{:<12} {:>8.1f} checks/s".format("inline", calls / secs))
+    for workers in (1, 2, 4, 8):
+        executor = HashingExecutor(workers)
+        start = time.perf_counter()
+        futures = [executor.is_valid(hashed, "eggcellent")
+                   for _ in range(calls)]
+        assert all(future.result() for future in futures)
+        secs = time.perf_counter() - start
+        executor.shutdown()
+        print("{:<12} {:>8.1f} checks/s".format(
+            "{} workers".format(workers), calls / secs
+        ))
+
+
+if __name__ == "__main__":
+    bench_redaction()
+    bench_structured()
+    bench_hashing()
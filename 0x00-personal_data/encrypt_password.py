@@ -1,20 +1,32 @@
 #!/usr/bin/env python3
 """Module defines `hash_password` function"""
+import asyncio
 import bcrypt
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Pool
+from os import cpu_count, environ
+from threading import BoundedSemaphore
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+ROUNDS = int(environ.get("BCRYPT_ROUNDS", 12))
 
-def hash_password(password: str) -> bytes:
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """Return hashed and salted password
 
     Args:
         password: a password string
+        rounds: bcrypt cost factor, `ROUNDS` when not given
 
     Returns:
         hashed and salted byte string password
     """
     return bcrypt.hashpw(
         password.encode('utf-8'),
-        bcrypt.gensalt()
+        bcrypt.gensalt(rounds or ROUNDS)
     )
 
 
@@ -32,3 +44,275 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         password.encode('utf-8'),
         hashed_password
     )
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """Return the cost factor a bcrypt hash was made with
+
+    Args:
+        hashed_password: a byte hashed string, `$2b$12$...`
+
+    Returns:
+        cost factor, 0 if it can not be read
+    """
+    try:
+        return int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def is_valid_rehash(
+        hashed_password: bytes,
+        password: str,
+        rounds: int = None
+        ) -> Tuple[bool, bool]:
+    """Check hash is from password and whether it should be rehashed
+
+    When the password is valid but the hash was made with another cost
+    than `rounds`, the caller should store `hash_password(password)`.
+
+    Args:
+        hashed_password: a byte hashed string
+        password: a plain text password string
+        rounds: wanted cost factor, `ROUNDS` when not given
+
+    Returns:
+        (valid, needs_rehash) tuple, needs_rehash is False if not valid
+    """
+    if not is_valid(hashed_password, password):
+        return (False, False)
+    return (True, hash_rounds(hashed_password) != (rounds or ROUNDS))
+
+
+def calibrate_rounds(
+        target_ms: float = 250,
+        samples: int = 3,
+        min_rounds: int = MIN_ROUNDS,
+        max_rounds: int = MAX_ROUNDS
+        ) -> int:
+    """Return highest cost factor whose hash fits in `target_ms` here
+
+    Each extra round doubles hashing time, so the time measured for
+    `min_rounds` is extrapolated and checked on the chosen cost.
+
+    Args:
+        target_ms: latency budget of one hash in milliseconds
+        samples: hashes timed per measured cost, the fastest is kept
+        min_rounds: lowest cost factor returned
+        max_rounds: highest cost factor returned
+
+    Returns:
+        cost factor to pass to `hash_password` or set as `BCRYPT_ROUNDS`
+    """
+    def measure(rounds: int) -> float:
+        """Return fastest hash time in ms at cost `rounds`"""
+        salt = bcrypt.gensalt(rounds)
+        best = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            spent = (time.perf_counter() - start) * 1000
+            best = spent if best is None else min(best, spent)
+        return best
+
+    base = measure(min_rounds)
+    rounds = min_rounds
+    while rounds < max_rounds and base * 2 ** (rounds + 1 - min_rounds) \
+            <= target_ms:
+        rounds += 1
+    while rounds > min_rounds and measure(rounds) > target_ms:
+        rounds -= 1
+    return rounds
+
+
+class HashingExecutor():
+    """HashingExecutor class
+
+    Runs bcrypt calls on a bounded pool of threads. bcrypt releases the
+    GIL while hashing so calls really run in parallel. At most
+    `max_pending` calls may be queued or running, `submit` waits up to
+    `timeout` seconds for room and raises `TimeoutError` otherwise.
+    `submit_async` waits the same way without blocking the event loop.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = None,
+            max_pending: int = None,
+            timeout: float = None
+            ):
+        """Initialize
+
+        Args:
+            max_workers: number of hashing threads, CPU count by default
+            max_pending: calls allowed in flight, 4 * max_workers by default
+            timeout: seconds `submit` waits for room, forever if None
+        """
+        self.max_workers = max_workers or cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._pool = ThreadPoolExecutor(
+            self.max_workers, thread_name_prefix="bcrypt"
+        )
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Schedule `fn(*args)` once a pending slot is free
+
+        Returns:
+            future of the call result
+
+        Raises:
+            TimeoutError: no slot freed within `timeout` seconds
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("too many pending bcrypt calls")
+        return self._start(fn, *args)
+
+    async def submit_async(self, fn: Callable, *args):
+        """Await `fn(*args)` once a pending slot is free
+
+        The slot is polled with a non-blocking acquire and the loop runs
+        other tasks in between, so a full pool never stalls it.
+
+        Returns:
+            result of the call
+
+        Raises:
+            TimeoutError: no slot freed within `timeout` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        delay = 0.001
+        while not self._slots.acquire(blocking=False):
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError("too many pending bcrypt calls")
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, 0.02)
+        return await asyncio.wrap_future(self._start(fn, *args))
+
+    def _start(self, fn: Callable, *args) -> Future:
+        """Run `fn(*args)` on the pool, a pending slot being acquired"""
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash_password(self, password: str) -> Future:
+        """Return future of `hash_password(password)`"""
+        return self.submit(hash_password, password)
+
+    def is_valid(self, hashed_password: bytes, password: str) -> Future:
+        """Return future of `is_valid(hashed_password, password)`"""
+        return self.submit(is_valid, hashed_password, password)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting calls, wait for running ones if `wait`"""
+        self._pool.shutdown(wait)
+
+
+_executor = None
+
+
+def get_executor() -> HashingExecutor:
+    """Return the module wide `HashingExecutor`, created on first call"""
+    global _executor
+    if _executor is None:
+        _executor = HashingExecutor()
+    return _executor
+
+
+async def hash_password_async(password: str) -> bytes:
+    """Awaitable `hash_password` run on `get_executor`
+
+    Args:
+        password: a password string
+
+    Returns:
+        hashed and salted byte string password
+    """
+    return await get_executor().submit_async(hash_password, password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str) -> bool:
+    """Awaitable `is_valid` run on `get_executor`
+
+    Args:
+        hashed_password: a byte hashed string
+        password: a plain text password string
+
+    Returns:
+        True if hash is from password, False otherwise
+    """
+    return await get_executor().submit_async(
+        is_valid, hashed_password, password
+    )
+
+
+def _first_valid(
+        task: Tuple[bytes, List[str]]
+        ) -> Tuple[bytes, Optional[str], int]:
+    """Return first candidate `task` hash is from, stopping there
+
+    Args:
+        task: (hashed_password, candidates) tuple
+
+    Returns:
+        (hashed_password, matching candidate or None, checks made) tuple
+    """
+    hashed_password, candidates = task
+    for checks, candidate in enumerate(candidates, 1):
+        if is_valid(hashed_password, candidate):
+            return (hashed_password, candidate, checks)
+    return (hashed_password, None, len(candidates))
+
+
+def audit_hashes(
+        pairs: Iterable[Tuple[bytes, str]],
+        processes: int = None,
+        chunk_size: int = 100,
+        progress: Callable[[dict], None] = None
+        ) -> Iterator[List[Tuple[bytes, Optional[str]]]]:
+    """Check many (hash, candidate) pairs on a pool of processes
+
+    Candidates are grouped by hash and each group is checked by one
+    worker which stops at the first match.
+
+    Args:
+        pairs: (hashed_password, candidate password) tuples
+        processes: number of worker processes, CPU count by default
+        chunk_size: number of hashes per yielded chunk
+        progress: called after every chunk with hashes done, hashes
+        total, checks made and checks per second
+
+    Returns:
+        generator of lists of (hashed_password, matching candidate or
+        None) tuples, in completion order
+    """
+    groups = {}
+    for hashed_password, candidate in pairs:
+        groups.setdefault(hashed_password, []).append(candidate)
+    total = len(groups)
+    done = checks = 0
+    chunk = []
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        for hashed_password, found, made in pool.imap_unordered(
+                _first_valid, groups.items(), chunksize=4):
+            chunk.append((hashed_password, found))
+            done += 1
+            checks += made
+            if len(chunk) == chunk_size or done == total:
+                if progress:
+                    spent = time.perf_counter() - start
+                    progress({
+                        "done": done,
+                        "total": total,
+                        "checks": checks,
+                        "checks_per_sec": checks / spent if spent else 0,
+                    })
+                yield chunk
+                chunk = []
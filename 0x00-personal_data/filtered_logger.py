@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
 """Module defines `filter_datum` function
 """
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 import logging
+from multiprocessing import Pool
 import mysql.connector
+import mysql.connector.pooling
 from os import environ
+from queue import Empty, Full, Queue
 import re
-from typing import List
+import sys
+from threading import Thread
+from time import perf_counter
+from typing import Callable, Iterator, List, TextIO, Tuple, Union
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+# Set as `redacted_by` on records of `log_structured` only, so `extra`
+# given by callers can not turn redaction off
+_STRUCTURED = object()
 
 
 class RedactingFormatter(logging.Formatter):
@@ -23,14 +35,177 @@ class RedactingFormatter(logging.Formatter):
         """Initialize"""
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = get_redactor(
+            tuple(fields), self.REDACTION, self.SEPARATOR
+        )
 
     def format(self, record: logging.LogRecord) -> str:
-        """Extended format function from parent class"""
-        return filter_datum(
-            self.fields, self.REDACTION,
-            logging.Formatter.format(self, record),
-            self.SEPARATOR,
+        """Extended format function from parent class
+
+        Records logged through `log_structured` are already redacted and
+        skip the regex pass.
+        """
+        if getattr(record, "redacted_by", None) is _STRUCTURED:
+            return logging.Formatter.format(self, record)
+        return self.redactor.redact(logging.Formatter.format(self, record))
+
+
+class Redactor():
+    """Redactor class
+
+    Holds a pattern compiled once for a set of fields, a redaction string
+    and a separator so each message is obfuscated in a single `sub` pass.
+    """
+
+    def __init__(self, fields: Tuple[str], redaction: str, separator: str):
+        """Initialize
+
+        Args:
+            fields: tuple of strings representing all fields to obfuscate
+            redaction: string by what the field will be obfuscated
+            separator: string separating all fields in the log line
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = re.compile(
+            r'({})=(.*?){}'.format('|'.join(fields), separator)
         )
+        self.replacement = r'\1={}'.format(redaction)
+
+    def redact(self, message: str) -> str:
+        """Return `message` obfuscated
+
+        Args:
+            message: string representing the log line
+
+        Returns:
+            obfuscated log message
+        """
+        return self.pattern.sub(self.replacement, message)
+
+
+@lru_cache(maxsize=64)
+def get_redactor(
+        fields: Tuple[str],
+        redaction: str,
+        separator: str
+        ) -> Redactor:
+    """Return a cached `Redactor` for a given configuration
+
+    Args:
+        fields: tuple of strings representing all fields to obfuscate
+        redaction: string by what the field will be obfuscated
+        separator: string separating all fields in the log line
+
+    Returns:
+        `Redactor` instance shared by every caller with the same arguments
+    """
+    return Redactor(fields, redaction, separator)
+
+
+class StructuredRedactor():
+    """StructuredRedactor class
+
+    Renders rows of known columns as `name=value;` lines, replacing values
+    of PII columns by key instead of searching the rendered line. Output
+    is the one `Redactor` gives for the same line, which drops the
+    separator after a redacted value.
+    """
+
+    def __init__(
+            self,
+            columns: Tuple[str],
+            fields: Tuple[str] = PII_FIELDS,
+            redaction: str = RedactingFormatter.REDACTION,
+            separator: str = RedactingFormatter.SEPARATOR
+            ):
+        """Initialize
+
+        Args:
+            columns: column names in the order values are given
+            fields: tuple of strings representing all fields to obfuscate
+            redaction: string by what the field will be obfuscated
+            separator: string terminating each `name=value` pair
+        """
+        self.columns = columns
+        self.fields = frozenset(fields)
+        self.redaction = redaction
+        self.separator = separator
+        # PII columns render to a constant, others to a prefix and a value
+        self.parts = [
+            (name + '=' + redaction, None)
+            if name in self.fields else (name + '=', separator)
+            for name in columns
+        ]
+
+    def render(self, row: Tuple) -> str:
+        """Return `row` as a redacted log message
+
+        Args:
+            row: values in the order of `columns`
+
+        Returns:
+            redacted `name=value;` line
+        """
+        out = []
+        for (head, tail), value in zip(self.parts, row):
+            if tail is None:
+                out.append(head)
+            else:
+                out.append(head + str(value) + tail)
+        return ''.join(out)
+
+    def render_dict(self, data: dict) -> str:
+        """Return a mapping as a redacted log message
+
+        Args:
+            data: column name to value mapping
+
+        Returns:
+            redacted `name=value;` line, in the mapping's order
+        """
+        return ''.join([
+            '{}={}'.format(key, self.redaction) if key in self.fields else
+            '{}={}{}'.format(key, value, self.separator)
+            for key, value in data.items()
+        ])
+
+
+@lru_cache(maxsize=64)
+def get_structured_redactor(columns: Tuple[str]) -> StructuredRedactor:
+    """Return a cached `StructuredRedactor` redacting `PII_FIELDS`
+
+    Args:
+        columns: column names in the order values are given
+
+    Returns:
+        `StructuredRedactor` instance shared by callers with same columns
+    """
+    return StructuredRedactor(columns)
+
+
+def log_structured(
+        logger: logging.Logger,
+        data: Union[dict, Tuple],
+        columns: Tuple[str] = None,
+        level: int = logging.INFO
+        ) -> None:
+    """Log a row or a mapping with `PII_FIELDS` redacted by key
+
+    Args:
+        logger: logger to log on, usually the one of `get_logger`
+        data: dictionary, or row tuple along with `columns`
+        columns: column names of `data` when it is a row
+        level: logging level of the record
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if isinstance(data, dict):
+        msg = get_structured_redactor(()).render_dict(data)
+    else:
+        msg = get_structured_redactor(tuple(columns)).render(data)
+    logger.log(level, msg, extra={"redacted_by": _STRUCTURED})
 
 
 def filter_datum(
@@ -51,25 +226,283 @@ def filter_datum(
     Returns:
         obfuscated log message
     """
-    return re.sub(
-            r'({})=(.*?){}'.format('|'.join(fields), separator),
-            r'\1={}'.format(redaction), message
+    return get_redactor(tuple(fields), redaction, separator).redact(message)
+
+
+class TimedHandlerMixin():
+    """TimedHandlerMixin class
+
+    Counts records handled and accumulates time spent in `handle`
+    """
+
+    calls = 0
+    seconds = 0.0
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """Time parent class `handle`"""
+        start = perf_counter()
+        try:
+            return super(TimedHandlerMixin, self).handle(record)
+        finally:
+            self.calls += 1
+            self.seconds += perf_counter() - start
+
+
+class TimedStreamHandler(TimedHandlerMixin, logging.StreamHandler):
+    """TimedStreamHandler class
+    """
+
+
+class AsyncRedactingHandler(TimedHandlerMixin, logging.Handler):
+    """AsyncRedactingHandler class
+
+    Enqueues records on a bounded queue and leaves formatting, redaction
+    and writing to a background thread which writes them in batches.
+    When the queue is full, records are dropped (`policy="drop"`) or the
+    caller waits for room (`policy="block"`).
+    """
+
+    POLICIES = ("drop", "block")
+
+    def __init__(
+            self,
+            stream: TextIO = None,
+            queue_size: int = 10000,
+            policy: str = "drop",
+            batch_size: int = 256
+            ):
+        """Initialize
+
+        Args:
+            stream: where lines are written, `sys.stderr` by default
+            queue_size: maximum number of records waiting to be written
+            policy: what to do with a record when the queue is full
+            batch_size: maximum number of records written at once
+        """
+        if policy not in self.POLICIES:
+            raise ValueError("policy must be one of {}".format(self.POLICIES))
+        super(AsyncRedactingHandler, self).__init__()
+        self.setFormatter(RedactingFormatter(list(PII_FIELDS)))
+        self.stream = stream or sys.stderr
+        self.policy = policy
+        self.batch_size = batch_size
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.max_depth = 0
+        self._listener = Thread(
+            target=self._listen, name="AsyncRedactingHandler", daemon=True
         )
+        self._listener.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Enqueue `record` without formatting it"""
+        # Freeze the message now, arguments may be mutated after the call
+        record.msg = record.getMessage()
+        record.args = None
+        if self.policy == "block":
+            self.queue.put(record)
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except Full:
+                self.dropped += 1
+                return
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _listen(self) -> None:
+        """Format, redact and write queued records until closed"""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            lines = []
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self.format(record) + '\n')
+                except Exception:
+                    self.handleError(record)
+            try:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+            except Exception:
+                pass
+            self.written += len(lines)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        """Wait until every record enqueued so far has been written"""
+        if self._listener.is_alive():
+            self.queue.join()
+
+    def close(self) -> None:
+        """Write pending records and stop the background thread"""
+        if self._listener.is_alive():
+            self.queue.put(None)
+            self._listener.join()
+        super(AsyncRedactingHandler, self).close()
+
+    def metrics(self) -> dict:
+        """Return queue depth, drop and write counters"""
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "capacity": self.queue.maxsize,
+            "dropped": self.dropped,
+            "written": self.written,
+        }
+
+
+# Loggers configured by `get_logger`: name -> (logger, arguments)
+_loggers = {}
+
+
+def get_logger(
+        non_blocking: bool = None,
+        name: str = "user_data",
+        reconfigure: bool = False,
+        **kwargs
+        ) -> logging.Logger:
+    """Return logger object
+
+    Each named logger is configured on first call only and cached, later
+    calls giving no mode, or the same arguments, return it as is instead
+    of stacking another handler.
 
+    Args:
+        non_blocking: if True, records are redacted and written by an
+        `AsyncRedactingHandler` instead of inside the logging call, if
+        None the cached mode or else False
+        name: name of the logger
+        reconfigure: if True, close the handlers of a cached logger and
+        configure it again with the arguments given
+        kwargs: passed to `AsyncRedactingHandler` when `non_blocking`
+
+    Returns:
+        configured logger named `name`
 
-def get_logger() -> logging.Logger:
-    """Return logger object"""
-    logger = logging.getLogger("user_data")
+    Raises:
+        ValueError: if `name` is cached with other arguments given
+        explicitly and `reconfigure` is False
+    """
+    logger, cached_config = _loggers.get(name, (None, None))
+    explicit = non_blocking is not None or kwargs
+    config = (bool(non_blocking), kwargs)
+    if logger is not None and not reconfigure:
+        if explicit and cached_config != config:
+            raise ValueError(
+                "logger {} is configured with other arguments, pass "
+                "reconfigure=True to change them".format(name)
+            )
+        return logger
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
     logger.setLevel(logging.INFO)
     logger.propagate = False
-    sh = logging.StreamHandler()
-    sh.setFormatter(RedactingFormatter(list(PII_FIELDS)))
-    logger.addHandler(sh)
+    if non_blocking:
+        logger.addHandler(AsyncRedactingHandler(**kwargs))
+    else:
+        sh = TimedStreamHandler()
+        sh.setFormatter(RedactingFormatter(list(PII_FIELDS)))
+        logger.addHandler(sh)
+    _loggers[name] = (logger, config)
     return logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
-    """Return a database connector object"""
+def logger_stats(name: str = "user_data") -> dict:
+    """Return handler count and per handler timings of a logger
+
+    Args:
+        name: name of the logger
+
+    Returns:
+        dictionary with the number of handlers and, for each of them,
+        records handled and time spent in `handle`
+    """
+    handlers = logging.getLogger(name).handlers
+    timings = []
+    for handler in handlers:
+        calls = getattr(handler, "calls", None)
+        seconds = getattr(handler, "seconds", None)
+        timings.append({
+            "handler": type(handler).__name__,
+            "calls": calls,
+            "seconds": seconds,
+            "avg_seconds": seconds / calls if calls else None,
+        })
+    return {"handlers": len(handlers), "timings": timings}
+
+
+_pools = {}
+
+
+def get_pool(
+        size: int = None
+        ) -> mysql.connector.pooling.MySQLConnectionPool:
+    """Return the connection pool for the `PERSONAL_DATA_DB_*` settings
+
+    Pools are created once per set of settings and reused afterwards.
+
+    Args:
+        size: number of connections, `PERSONAL_DATA_DB_POOL_SIZE` or 5
+        when not given
+
+    Returns:
+        a `MySQLConnectionPool` instance
+    """
+    if size is None:
+        size = int(environ.get("PERSONAL_DATA_DB_POOL_SIZE", 5))
+    config = (
+        ("user", environ.get("PERSONAL_DATA_DB_USERNAME")),
+        ("password", environ.get("PERSONAL_DATA_DB_PASSWORD")),
+        ("host", environ.get("PERSONAL_DATA_DB_HOST")),
+        ("database", environ.get("PERSONAL_DATA_DB_NAME")),
+    )
+    pool = _pools.get((config, size))
+    if pool is None:
+        pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="personal_data_{}".format(len(_pools)),
+            pool_size=size,
+            **dict(config)
+        )
+        _pools[(config, size)] = pool
+    return pool
+
+
+def get_db(
+        pooled: bool = False
+        ) -> mysql.connector.connection.MySQLConnection:
+    """Return a database connector object
+
+    Args:
+        pooled: if True, borrow a connection from `get_pool` instead of
+        opening a new one. Closing it hands it back to the pool
+
+    Returns:
+        a connection, checked alive when it comes from the pool
+    """
+    if pooled:
+        con = get_pool().get_connection()
+        try:
+            con.ping(reconnect=True, attempts=1)
+        except mysql.connector.Error:
+            con.close()
+            raise
+        return con
     return mysql.connector.connect(
         user=environ.get("PERSONAL_DATA_DB_USERNAME"),
         password=environ.get("PERSONAL_DATA_DB_PASSWORD"),
@@ -78,30 +511,156 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
-def main() -> None:
-    """Logs redacted recrods from MySQL database"""
+@contextmanager
+def db_connection(
+        ) -> Iterator[mysql.connector.connection.MySQLConnection]:
+    """Borrow a pooled connection for the duration of a `with` block
+
+    Returns:
+        context manager giving a live connection and returning it to the
+        pool on exit
+    """
+    con = get_db(pooled=True)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+def row_formatter(columns: List[str]) -> Callable[[Tuple], str]:
+    """Return a function rendering a row as `column_name=value; ...`
+
+    `column_name=` prefixes are built once so each row only costs one
+    `str` call per value and a single `join`.
+
+    Args:
+        columns: column names in the order rows are fetched
+
+    Returns:
+        function taking a row tuple and returning its log message
+    """
+    prefixes = [name + '=' for name in columns]
+
+    def format_row(row: Tuple) -> str:
+        """Return `row` as a log message"""
+        return '; '.join([pre + str(val) for pre, val in zip(prefixes, row)])
+    return format_row
+
+
+def stream_rows(
+        cursor: mysql.connector.cursor.MySQLCursor,
+        batch_size: int = 1000
+        ) -> Iterator[List[Tuple]]:
+    """Yield rows of an executed query in `fetchmany` batches
+
+    Args:
+        cursor: cursor a query has been executed on
+        batch_size: number of rows fetched per round trip
+
+    Returns:
+        generator of row lists, never holding more than `batch_size` rows
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+_worker = {}
+
+
+def _init_redaction_worker(columns: List[str]) -> None:
+    """Build row formatter and `RedactingFormatter` once per worker process
+
+    Args:
+        columns: column names in the order rows are fetched
+    """
+    _worker["format_row"] = row_formatter(columns)
+    _worker["formatter"] = RedactingFormatter(list(PII_FIELDS))
+
+
+def _redact_batch(rows: List[Tuple]) -> str:
+    """Return a batch of rows as redacted log lines, as `get_logger` would
+
+    Args:
+        rows: row tuples fetched from the `users` table
+
+    Returns:
+        newline terminated redacted log lines of the whole batch
+    """
+    format_row = _worker["format_row"]
+    formatter = _worker["formatter"]
+    lines = []
+    for row in rows:
+        record = logging.LogRecord(
+            "user_data", logging.INFO, __file__, 0, format_row(row), (), None
+        )
+        lines.append(formatter.format(record) + '\n')
+    return ''.join(lines)
+
+
+def parallel_redact(
+        cursor: mysql.connector.cursor.MySQLCursor,
+        processes: int,
+        batch_size: int = 1000,
+        stream: TextIO = None
+        ) -> None:
+    """Redact rows of an executed query on a pool of processes
+
+    The calling process reads batches and writes results in fetch order,
+    workers format and redact. At most `2 * processes` batches are in
+    flight so memory stays bounded.
+
+    Args:
+        cursor: cursor a query has been executed on
+        processes: number of worker processes
+        batch_size: number of rows per batch handed to a worker
+        stream: where lines are written, `sys.stderr` by default like
+        `logging.StreamHandler`
+    """
+    stream = stream or sys.stderr
+    columns = [desc[0] for desc in cursor.description]
+    pending = deque()
+    with Pool(processes, _init_redaction_worker, (columns,)) as pool:
+        for rows in stream_rows(cursor, batch_size):
+            pending.append(pool.apply_async(_redact_batch, (rows,)))
+            if len(pending) >= 2 * processes:
+                stream.write(pending.popleft().get())
+        while pending:
+            stream.write(pending.popleft().get())
+    stream.flush()
+
+
+def main(batch_size: int = 1000, processes: int = 0) -> None:
+    """Logs redacted recrods from MySQL database
+
+    Rows are read and logged batch by batch so memory stays flat whatever
+    the size of the `users` table.
+
+    Args:
+        batch_size: number of rows fetched from the server at once
+        processes: if positive, redact on that many worker processes
+        with `parallel_redact` instead of in the logging call
+    """
     con = get_db()  # Get connection to database
-    cur = con.cursor()  # Get a cursor object from mysql shell
+    cur = con.cursor()  # Unbuffered cursor, rows stay on the server
     query = "SELECT * FROM users;"  # Construct a query
-    cur.execute(query)  # Execute query in and get response object
-
-    # Get column names in a list
-    col = list(map(lambda row: row[0], cur.description))
-    message = []
-    logger = get_logger()
 
-    # construct `column_name`=`data` list for each row and append to message
     try:
-        for row in cur.fetchall():
-            message.append('; '.join(list(map(
-                    lambda name, value: name+'='+str(value), col, row
-                ))))
+        cur.execute(query)  # Execute query in and get response object
+        if processes > 0:
+            parallel_redact(cur, processes, batch_size)
+            return
+        logger = get_logger()
+        format_row = row_formatter([desc[0] for desc in cur.description])
+        for rows in stream_rows(cur, batch_size):
+            for row in rows:
+                logger.info(format_row(row))
     except Exception as e:
         print(e)
     finally:
         con.close()
-    for msg in message:
-        logger.info(msg)
 
 
 if __name__ == "__main__":
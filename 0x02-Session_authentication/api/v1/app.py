@@ -4,6 +4,7 @@ Route module for the API
 """
 from os import getenv
 from typing import Tuple
+from api.v1.auth.auth import PathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -13,6 +14,13 @@ app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
+EXCLUDED_PATHS = PathMatcher([
+    "/api/v1/status/",
+    "/api/v1/unauthorized/",
+    "/api/v1/forbidden/",
+    "/api/v1/auth_session/login/"
+])
+
 auth = None
 auth = getenv('AUTH_TYPE')
 if auth:
@@ -58,15 +66,7 @@ def forbidden(error) -> Tuple:
 def filter_req() -> None:
     """filter_req function"""
     if auth:
-        needs_auth = auth.require_auth(
-            request.path,
-            [
-                "/api/v1/status/",
-                "/api/v1/unauthorized/",
-                "/api/v1/forbidden/",
-                "/api/v1/auth_session/login/"
-            ]
-        )
+        needs_auth = auth.require_auth(request.path, EXCLUDED_PATHS)
         if needs_auth is True:
             auth_type = type(auth).__name__
             if auth_type == "BasicAuth":
@@ -77,9 +77,10 @@ def filter_req() -> None:
             ):
                 if auth.session_cookie(request) is None:
                     abort(401)
-            if auth.current_user(request) is None:
+            user = auth.resolve_user(request)
+            if user is None:
                 abort(403)
-            request.current_user = auth.current_user(request)
+            request.current_user = user
         return None
 
 
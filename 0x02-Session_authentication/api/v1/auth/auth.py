@@ -1,31 +1,99 @@
 #!/usr/bin/env python3
 """Module defines `Auth` class"""
+from functools import lru_cache
 from os import getenv
-import re
-from typing import List, TypeVar, Union
+from time import perf_counter
+from typing import Callable, List, Tuple, TypeVar, Union
+
+
+class PathMatcher():
+    """PathMatcher class
+
+    Built once from a list of excluded paths: exact paths go to a set,
+    paths ending with `*` to a prefix trie.
+    """
+
+    END = ""
+
+    def __init__(self, excluded_paths: List[str]):
+        """Initialize
+
+        Args:
+            excluded_paths: list of paths internally deemed public
+        """
+        self.exact = set(excluded_paths)
+        self.trie = {}
+        for pth in excluded_paths:
+            if pth and pth[-1] == '*':
+                node = self.trie
+                for char in pth[:-1]:
+                    node = node.setdefault(char, {})
+                node[self.END] = True
+
+    def __len__(self) -> int:
+        """Number of excluded paths"""
+        return len(self.exact)
+
+    def match(self, path: str) -> bool:
+        """Check if path is excluded
+
+        Args:
+            path: path requested
+
+        Returns:
+            True if path, or path with a trailing slash, is an excluded
+            path or starts with the prefix of a `*` one, False otherwise
+        """
+        if path in self.exact or path + '/' in self.exact:
+            return True
+        node = self.trie
+        if self.END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self.END in node:
+                return True
+        return False
+
+
+@lru_cache(maxsize=32)
+def get_path_matcher(excluded_paths: Tuple[str]) -> PathMatcher:
+    """Return a cached `PathMatcher` of `excluded_paths`"""
+    return PathMatcher(list(excluded_paths))
 
 
 class Auth():
     """Auth class
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    # Key of the resolved user in the WSGI environ of a request
+    ENVIRON_KEY = "api.v1.auth.current_user"
+    # Callables receiving (seconds, user) after each user resolution
+    timing_hooks = ()
+
+    def require_auth(
+        self,
+        path: str,
+        excluded_paths: Union[List[str], PathMatcher]
+    ) -> bool:
         """Function checks request paths against excluded ones
 
         Args:
             path: path requested
-            excluded_paths: list of paths internally deemed public
+            excluded_paths: list of paths internally deemed public, or
+            a `PathMatcher` built from it
 
         Returns:
             True if path is not found in excluded_paths, False otheriwse
         """
         if path:
-            if excluded_paths is not None and excluded_paths != []:
-                if path in excluded_paths or path + '/' in excluded_paths:
+            if excluded_paths is not None and len(excluded_paths) != 0:
+                if not isinstance(excluded_paths, PathMatcher):
+                    excluded_paths = get_path_matcher(tuple(excluded_paths))
+                if excluded_paths.match(path):
                     return False
-                for pth in excluded_paths:
-                    if pth[-1] == '*' and re.compile(pth[:-1]).match(path):
-                        return False
         return True
 
     def authorization_header(self, request=None) -> Union[str, None]:
@@ -45,6 +113,39 @@ class Auth():
         """`current_user` function"""
         return None
 
+    def resolve_user(self, request=None) -> TypeVar('User'):
+        """Return `current_user` of a request, computed once per request
+
+        The user, or None, is kept in the request's WSGI environ so later
+        calls for the same request skip credential checks and lookups.
+        Each actual resolution is timed and reported to `timing_hooks`.
+
+        Args:
+            request: request object (imported from flask & passed by reference)
+
+        Returns:
+            User instance authenticated by the request, None if any
+        """
+        environ = getattr(request, "environ", None)
+        if environ is not None and self.ENVIRON_KEY in environ:
+            return environ[self.ENVIRON_KEY]
+        start = perf_counter()
+        user = self.current_user(request)
+        spent = perf_counter() - start
+        for hook in self.timing_hooks:
+            hook(spent, user)
+        if environ is not None:
+            environ[self.ENVIRON_KEY] = user
+        return user
+
+    def add_timing_hook(self, hook: Callable[[float, object], None]) -> None:
+        """Register `hook(seconds, user)` called after each resolution
+
+        Args:
+            hook: callable receiving time spent resolving and the user
+        """
+        self.timing_hooks = self.timing_hooks + (hook,)
+
     def session_cookie(self, request=None) -> str:
         """Return cookie value from a request
 
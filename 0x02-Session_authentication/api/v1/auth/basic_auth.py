@@ -2,14 +2,36 @@
 """Module defines `BasicAuth` class"""
 from api.v1.auth.auth import Auth
 import base64
+from collections import OrderedDict
+import hashlib
+import hmac
 from models.user import User
+from os import getenv, urandom
+from threading import Lock
+import time
 from typing import Union, TypeVar
 
 
 class BasicAuth(Auth):
     """BasicAuth class
+
+    Verified credentials are cached: a keyed hash of the raw
+    `Authorization` header maps to the user id and the user's version
+    (see `Base.version`) at verification time. An entry is used only
+    while younger than `cache_ttl` seconds and while the user has not
+    been saved or removed since.
     """
 
+    def __init__(self) -> None:
+        """Initialize"""
+        self.cache_size = int(getenv("BASIC_AUTH_CACHE_SIZE", 1024))
+        self.cache_ttl = float(getenv("BASIC_AUTH_CACHE_TTL", 300))
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self._cache_secret = urandom(32)
+
     def extract_base64_authorization_header(
         self,
         authorization_header: str
@@ -111,6 +133,10 @@ class BasicAuth(Auth):
         auth_header = self.authorization_header(request)
         if not auth_header:
             return None
+        key = self.credentials_key(auth_header)
+        user = self.cached_user(key)
+        if user is not None:
+            return user
         cred = self.extract_base64_authorization_header(auth_header)
         if not cred:
             return None
@@ -120,7 +146,85 @@ class BasicAuth(Auth):
         cred_tuple = self.extract_user_credentials(cred_str)
         if cred_tuple == (None, None):
             return None
+        since = User.version()
         user = self.user_object_from_credentials(*cred_tuple)
+        if user is not None:
+            self.cache_user(key, user, since)
         return user
 
+    def credentials_key(self, authorization_header: str) -> bytes:
+        """Return keyed hash of an `Authorization` header
+
+        Args:
+            authorization_header: raw Authorization header of a request
+
+        Returns:
+            HMAC-SHA256 digest, no credential is kept in clear
+        """
+        return hmac.new(self._cache_secret, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def cached_user(self, key: bytes) -> TypeVar('User'):
+        """Return user cached under `key` if the entry is still valid
+
+        Args:
+            key: `credentials_key` of the request's header
+
+        Returns:
+            User instance, None on a miss
+        """
+        if self.cache_size <= 0:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is not None:
+            user_id, version, expires = entry
+            user = User.get(user_id)
+            if user is not None and time.monotonic() < expires and \
+                    User.version(user_id) == version:
+                self.cache_hits += 1
+                return user
+            with self._cache_lock:
+                self._cache.pop(key, None)
+        self.cache_misses += 1
+        return None
+
+    def cache_user(
+        self,
+        key: bytes,
+        user: TypeVar('User'),
+        since: str = None
+    ) -> None:
+        """Cache `user` as verified for `key`, evicting least recent
+
+        Args:
+            key: `credentials_key` of the request's header
+            user: User instance the credentials are valid for
+            since: `User.version()` taken before the credentials were
+                verified, nothing is cached if a user was saved or
+                removed since
+        """
+        if self.cache_size <= 0:
+            return
+        entry = (user.id, User.version(user.id),
+                 time.monotonic() + self.cache_ttl)
+        if since is not None and User.version() != since:
+            return
+        with self._cache_lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """Return size, hit and miss counters of the credentials cache"""
+        return {
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+        }
+
     pass
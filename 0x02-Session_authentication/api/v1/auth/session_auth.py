@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Module defines `SessionAuth` class"""
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import get_session_store
 from models.user import User
 from typing import TypeVar
 from uuid import uuid4
@@ -8,8 +9,11 @@ from uuid import uuid4
 
 class SessionAuth(Auth):
     """SessionAuth class
+
+    Sessions are kept in `user_id_by_session_id`, a `SessionStore`
+    chosen with the `SESSION_STORE` environment variable
     """
-    user_id_by_session_id = {}
+    user_id_by_session_id = get_session_store()
 
     def create_session(self, user_id: str = None) -> str:
         """Create a session id for user with id `user_id`
@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 """Module defines `SessionDBAuth` class"""
 from api.v1.auth.session_exp_auth import SessionExpAuth
-from datetime import datetime
+from datetime import datetime, timezone
 from models.user_session import UserSession
 
 
 class SessionDBAuth(SessionExpAuth):
     """SessionDBAuth class"""
+    def __init__(self) -> None:
+        """Initialize
+
+        Serialized sessions loaded from file are tracked for expiry too
+        """
+        super().__init__()
+        if self.session_duration > 0:
+            for usr_sess in UserSession.all():
+                self.track_expiry(
+                    usr_sess.session_id,
+                    usr_sess.created_at.replace(tzinfo=timezone.utc)
+                )
+
     def create_session(self, user_id: str = None) -> str:
         """Overload `SessionExpAuth's` `create_session` method
 
@@ -47,6 +60,7 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             user_id if session has not expired, None otherwise
         """
+        self.sweep()
         try:
             usr = UserSession.search({"session_id": session_id})[0]
         except IndexError:
@@ -62,6 +76,42 @@ class SessionDBAuth(SessionExpAuth):
             return usr.user_id
         return None
 
+    def session_expires(self, session_id: str) -> float:
+        """Overload `SessionExpAuth's` `session_expires` method
+
+        Expiry comes from the serialized session object, whose
+        `created_at` is in UTC
+
+        Args:
+            session_id: uuid of session created by `create_session`
+
+        Returns:
+            expiry timestamp, None if there is no such session
+        """
+        usr_sess = UserSession.search({"session_id": session_id})
+        if not usr_sess:
+            return None
+        created_at = usr_sess[0].created_at.replace(tzinfo=timezone.utc)
+        return created_at.timestamp() + self.session_duration
+
+    def evict_sessions(self, session_ids: list) -> None:
+        """Overload `SessionExpAuth's` `evict_sessions` method
+
+        Also remove the serialized session objects, writing the file once
+
+        Args:
+            session_ids: uuids of sessions created by `create_session`
+        """
+        super().evict_sessions(session_ids)
+        UserSession.remove_many([
+            usr_sess for sessid in session_ids
+            for usr_sess in UserSession.search({"session_id": sessid})
+        ])
+
+    def live_sessions(self) -> int:
+        """Overload `SessionExpAuth's` `live_sessions` method"""
+        return UserSession.count()
+
     def destroy_session(self, request=None) -> bool:
         """Overload `SessionAuth's` `destroy_session` method
 
@@ -1,18 +1,43 @@
 #!/usr/bin/env python3
 """Module defines `SessionExpAuth` class"""
 from datetime import datetime, timedelta
+import heapq
 from os import getenv
+from threading import Event, Lock, Thread
+import time
 from api.v1.auth.session_auth import SessionAuth
 
 
 class SessionExpAuth(SessionAuth):
-    """SessionExpAuth class"""
+    """SessionExpAuth class
+
+    Sessions expiring are tracked in a min-heap of
+    (`created_at` + `session_duration`, session id) entries. `sweep`
+    pops the expired ones and evicts them at once with `evict_sessions`,
+    it runs on every session lookup or creation and, when
+    `SESSION_SWEEP_INTERVAL` is set, from a background thread too.
+    """
     def __init__(self, ) -> None:
         """Initialize"""
         try:
             self.session_duration = int(getenv("SESSION_DURATION", 0))
         except Exception:
             self.session_duration = 0
+        try:
+            self.sweep_interval = float(getenv("SESSION_SWEEP_INTERVAL", 0))
+        except Exception:
+            self.sweep_interval = 0
+        self._expiries = []
+        self._expiries_lock = Lock()
+        self.evicted = 0
+        self.sweep_started = time.monotonic()
+        self._stop_sweeper = Event()
+        if self.session_duration > 0:
+            for sessid, sess_dct in list(self.user_id_by_session_id.items()):
+                if isinstance(sess_dct, dict):
+                    self.track_expiry(sessid, sess_dct.get("created_at"))
+            if self.sweep_interval > 0:
+                Thread(target=self._sweeper, daemon=True).start()
         return None
 
     def create_session(self, user_id: str = None) -> str:
@@ -32,10 +57,13 @@ class SessionExpAuth(SessionAuth):
         """
         sessid = super().create_session(user_id)
         if sessid:
+            created_at = datetime.now()
             super().user_id_by_session_id[sessid] = {
                 "user_id": user_id,
-                "created_at": datetime.now()
+                "created_at": created_at
             }
+            self.track_expiry(sessid, created_at)
+            self.sweep()
             return sessid
         return None
 
@@ -53,6 +81,7 @@ class SessionExpAuth(SessionAuth):
         Returns:
             user_id if session has not expired, None otherwise
         """
+        self.sweep()
         sess_dct = super().user_id_for_session_id(session_id)
         if sess_dct is None or not isinstance(sess_dct, dict):
             return None
@@ -89,4 +118,94 @@ class SessionExpAuth(SessionAuth):
 
         return left.total_seconds() < 0
 
+    def track_expiry(self, session_id: str, created_at: datetime) -> None:
+        """Add session `session_id` created at `created_at` to the
+        expiry heap, sessions never expire when `session_duration` is 0
+
+        Args:
+            session_id: uuid of session created by `create_session`
+            created_at: creation time of session
+        """
+        if self.session_duration <= 0 or created_at is None:
+            return None
+        expires = created_at.timestamp() + self.session_duration
+        with self._expiries_lock:
+            heapq.heappush(self._expiries, (expires, session_id))
+
+    def sweep(self, now: datetime = None) -> int:
+        """Evict sessions expired at `now`
+
+        Only heap entries due are popped, so a sweep costs
+        O(expired * log(sessions)) and nothing when no session expired.
+        Entries of sessions destroyed meanwhile are dropped.
+
+        Args:
+            now: time to sweep at, current time if None
+
+        Returns:
+            number of sessions evicted
+        """
+        now = (now or datetime.now()).timestamp()
+        due = []
+        with self._expiries_lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                due.append(heapq.heappop(self._expiries)[1])
+        expired = []
+        for sessid in due:
+            expires = self.session_expires(sessid)
+            if expires is not None and expires <= now:
+                expired.append(sessid)
+        if expired:
+            self.evict_sessions(expired)
+        self.evicted += len(expired)
+        return len(expired)
+
+    def session_expires(self, session_id: str) -> float:
+        """Return the expiry of session `session_id` as a timestamp
+
+        Args:
+            session_id: uuid of session created by `create_session`
+
+        Returns:
+            expiry timestamp, None if there is no such session
+        """
+        sess_dct = self.user_id_by_session_id.get(session_id)
+        if not isinstance(sess_dct, dict) or not sess_dct.get("created_at"):
+            return None
+        return sess_dct["created_at"].timestamp() + self.session_duration
+
+    def evict_sessions(self, session_ids: list) -> None:
+        """Remove expired sessions `session_ids` from the session store
+
+        Args:
+            session_ids: uuids of sessions created by `create_session`
+        """
+        for sessid in session_ids:
+            self.user_id_by_session_id.pop(sessid, None)
+
+    def live_sessions(self) -> int:
+        """Return the number of sessions held"""
+        return len(self.user_id_by_session_id)
+
+    def _sweeper(self) -> None:
+        """Sweep every `sweep_interval` seconds until `stop_sweeper`"""
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            self.sweep()
+
+    def stop_sweeper(self) -> None:
+        """Stop the background sweeper thread, if any"""
+        self._stop_sweeper.set()
+
+    def sweep_stats(self) -> dict:
+        """Return live sessions count, sessions awaiting expiry, evicted
+        sessions count and eviction rate per second since start
+        """
+        spent = time.monotonic() - self.sweep_started
+        return {
+            "live": self.live_sessions(),
+            "tracked": len(self._expiries),
+            "evicted": self.evicted,
+            "evictions_per_second": self.evicted / spent if spent else 0.0,
+        }
+
     pass
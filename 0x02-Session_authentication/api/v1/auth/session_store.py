@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Module defines session store classes used by `SessionAuth`"""
+from collections.abc import MutableMapping
+from datetime import datetime
+from os import getenv, getpid
+import sqlite3
+from threading import local
+from typing import Iterator, Union
+
+
+class SessionStore(MutableMapping):
+    """SessionStore class
+
+    Maps session ids to what `SessionAuth` and its subclasses keep for a
+    session: a user id, or a dictionary holding `user_id` and
+    `created_at`.
+    """
+    pass
+
+
+class MemorySessionStore(SessionStore):
+    """MemorySessionStore class
+
+    Sessions live in a dictionary of the current process only
+    """
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self.sessions = {}
+
+    def __getitem__(self, session_id: str) -> Union[str, dict]:
+        """Return session of `session_id`, KeyError if missing"""
+        return self.sessions[session_id]
+
+    def __setitem__(self, session_id: str, value: Union[str, dict]) -> None:
+        """Store session `value` under `session_id`"""
+        self.sessions[session_id] = value
+
+    def __delitem__(self, session_id: str) -> None:
+        """Remove session of `session_id`, KeyError if missing"""
+        del self.sessions[session_id]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over session ids"""
+        return iter(list(self.sessions))
+
+    def __len__(self) -> int:
+        """Number of sessions"""
+        return len(self.sessions)
+
+    def items(self) -> list:
+        """Return (session id, session) pairs"""
+        return list(self.sessions.items())
+
+    def clear(self) -> None:
+        """Remove every session"""
+        self.sessions.clear()
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLiteSessionStore class
+
+    Sessions live in an SQLite file shared by every process of the host
+    opening the same `file_path`, so any worker sees logins made by
+    another. Each thread uses its own connection, opened on first use and
+    never shared with a process forked afterwards.
+    """
+
+    def __init__(self, file_path: str = ".sessions.sqlite3") -> None:
+        """Initialize
+
+        Args:
+            file_path: path of the SQLite database file
+        """
+        self.file_path = file_path
+        self._local = local()
+        # Connections inherited through fork(), kept referenced so they
+        # are never used nor closed by the child
+        self._inherited = []
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the connection of the calling thread and process"""
+        con = getattr(self._local, "con", None)
+        if con is not None and self._local.pid == getpid():
+            return con
+        if con is not None:
+            self._inherited.append(con)
+        con = sqlite3.connect(self.file_path, timeout=30,
+                              isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, user_id TEXT, created_at REAL)"
+        )
+        self._local.con, self._local.pid = con, getpid()
+        return con
+
+    def __getitem__(self, session_id: str) -> Union[str, dict]:
+        """Return session of `session_id`, KeyError if missing"""
+        row = self.connection().execute(
+            "SELECT user_id, created_at FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        return self.session(*row)
+
+    @staticmethod
+    def session(user_id: str, created_at: float) -> Union[str, dict]:
+        """Return the session stored as `user_id` and `created_at`"""
+        if created_at is None:
+            return user_id
+        return {
+            "user_id": user_id,
+            "created_at": datetime.fromtimestamp(created_at)
+        }
+
+    def __setitem__(self, session_id: str, value: Union[str, dict]) -> None:
+        """Store session `value` under `session_id`"""
+        if isinstance(value, dict):
+            user_id = value.get("user_id")
+            created_at = value.get("created_at")
+            created_at = created_at.timestamp() if created_at else None
+        else:
+            user_id, created_at = value, None
+        self.connection().execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session_id, user_id, created_at)
+        )
+
+    def __delitem__(self, session_id: str) -> None:
+        """Remove session of `session_id`, KeyError if missing"""
+        cur = self.connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        if cur.rowcount == 0:
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over session ids"""
+        rows = self.connection().execute(
+            "SELECT session_id FROM sessions"
+        ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        """Number of sessions"""
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM sessions"
+        ).fetchone()[0]
+
+    def items(self) -> list:
+        """Return (session id, session) pairs, read in one query"""
+        rows = self.connection().execute(
+            "SELECT session_id, user_id, created_at FROM sessions"
+        ).fetchall()
+        return [(row[0], self.session(row[1], row[2])) for row in rows]
+
+    def clear(self) -> None:
+        """Remove every session"""
+        self.connection().execute("DELETE FROM sessions")
+
+
+def get_session_store() -> SessionStore:
+    """Return the session store selected by `SESSION_STORE`
+
+    `SESSION_STORE=sqlite` shares sessions between the processes of a
+    host through the file `SESSION_STORE_PATH`, anything else keeps them
+    in the current process.
+    """
+    if getenv("SESSION_STORE") == "sqlite":
+        return SQLiteSessionStore(
+            getenv("SESSION_STORE_PATH", ".sessions.sqlite3")
+        )
+    return MemorySessionStore()
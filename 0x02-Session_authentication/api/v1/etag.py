@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Module defines ETag helpers of conditional GET requests"""
+from flask import request, Response
+from typing import Union
+
+
+def not_modified(etag: str) -> Union[Response, None]:
+    """Return an empty 304 response if the client has `etag`
+
+    Args:
+        etag: current entity tag of the requested resource
+
+    Returns:
+        304 response if `If-None-Match` matches `etag`, None otherwise
+    """
+    if request.if_none_match.contains(etag):
+        out = Response(status=304)
+        out.set_etag(etag)
+        return out
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Return `response` with its ETag header set to `etag`"""
+    response.set_etag(etag)
+    return response
@@ -2,6 +2,7 @@
 """ Module of Index views
 """
 from flask import jsonify, abort
+from api.v1.etag import not_modified, with_etag
 from api.v1.views import app_views
 
 
@@ -19,11 +20,16 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - 304 if If-None-Match holds the current ETag
     """
     from models.user import User
+    etag = User.version()
+    cached = not_modified(etag)
+    if cached:
+        return cached
     stats = {}
     stats['users'] = User.count()
-    return jsonify(stats)
+    return with_etag(jsonify(stats), etag)
 
 
 @app_views.route('/unauthorized', strict_slashes=False)
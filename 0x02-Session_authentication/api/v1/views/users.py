@@ -1,19 +1,84 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+from api.v1.etag import not_modified, with_etag
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
+import json
+from zlib import crc32
 from models.user import User
+from typing import Iterable, Iterator
+
+
+STREAM_CHUNK = 500
+MAX_LIMIT = 1000
+# Attributes GET /api/v1/users may be filtered on
+FILTERS = ("id", "email", "first_name", "last_name")
+
+
+def stream_json_list(
+    objs: Iterable,
+    chunk: int = STREAM_CHUNK,
+    fields: list = None
+) -> Iterator:
+    """ Yield the JSON array of `objs` by pieces of `chunk` objects
+
+    Keys are sorted as `jsonify` does, only `fields` are kept if given
+    """
+    sep = "["
+    buf = []
+    for obj in objs:
+        obj_json = obj.to_json()
+        if fields:
+            obj_json = {k: obj_json[k] for k in fields if k in obj_json}
+        buf.append(sep)
+        buf.append(json.dumps(obj_json, sort_keys=True))
+        sep = ","
+        if len(buf) >= 2 * chunk:
+            yield "".join(buf)
+            buf = []
+    buf.append("[]" if sep == "[" else "]")
+    buf.append("\n")
+    yield "".join(buf)
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: page size, the cursor of the next page, if any, is sent
+        in the X-Next-Cursor header
+      - cursor: X-Next-Cursor of the previous page
+      - fields: comma separated attributes to return
+      - email, first_name, last_name, id: equality filters
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, streamed
+      - 304 if If-None-Match holds the ETag of the same query
+      - 400 if limit or cursor is not valid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    etag = "{}-{:x}".format(User.version(), crc32(request.query_string))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    args = request.args
+    fields = [f for f in args.get("fields", "").split(",") if f]
+    filters = {k: args[k] for k in FILTERS if k in args}
+    if "limit" not in args and "cursor" not in args and not filters:
+        return with_etag(Response(stream_json_list(User.all(), fields=fields),
+                                  mimetype="application/json"), etag)
+    try:
+        limit = int(args.get("limit", MAX_LIMIT))
+        if limit <= 0:
+            raise ValueError
+        users, next_cursor = User.page(min(limit, MAX_LIMIT),
+                                       args.get("cursor"), filters)
+    except ValueError:
+        return jsonify({'error': "Wrong limit or cursor"}), 400
+    out = Response(stream_json_list(users, fields=fields),
+                   mimetype="application/json")
+    if next_cursor:
+        out.headers["X-Next-Cursor"] = next_cursor
+    return with_etag(out, etag)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -23,6 +88,7 @@ def view_one_user(user_id: str = None) -> str:
       - User ID
     Return:
       - User object JSON represented
+      - 304 if If-None-Match holds the ETag of the User
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -30,11 +96,16 @@ def view_one_user(user_id: str = None) -> str:
     if user_id == "me" and request.current_user is None:
         abort(404)
     elif user_id == "me":
-        return jsonify(request.current_user.to_json())
-    user = User.get(user_id)
+        user = request.current_user
+    else:
+        user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    etag = User.version(user.id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify(user.to_json()), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
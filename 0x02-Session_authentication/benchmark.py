@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+""" Benchmarks of the models storage
+Usage: python3 benchmark.py [users...]
+"""
+from datetime import datetime
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+
+from models import base
+from models.user import User
+
+
+def populate(count: int) -> None:
+    """ Fill DATA with `count` users without touching files
+    """
+    base.DATA["User"] = {}
+    for i in range(count):
+        user = User(email="user{}@example.com".format(i))
+        base.DATA["User"][user.id] = user
+    User.build_indexes()
+
+
+def bench_writes(sizes: list, writes: int = 20) -> None:
+    """ Time User.save() with full rewrites and with the journal
+    """
+    for size in sizes:
+        for journal in (False, True):
+            populate(size)
+            User.save_to_file()
+            base.JOURNAL = journal
+            start = time.perf_counter()
+            for i in range(writes):
+                User(email="new{}@example.com".format(i)).save()
+            spent = (time.perf_counter() - start) / writes
+            print("{:>8} users {:<8} {:>10.3f} ms/save".format(
+                size, "journal" if journal else "rewrite", spent * 1000
+            ))
+    base.JOURNAL = False
+
+
+def bench_search(sizes: list, lookups: int = 200) -> None:
+    """ Time User.search by email with and without the email index
+    """
+    for size in sizes:
+        populate(size)
+        emails = ["user{}@example.com".format(i * size // lookups)
+                  for i in range(lookups)]
+        for indexed in (False, True):
+            User.__indexes__ = ("email",) if indexed else ()
+            start = time.perf_counter()
+            for email in emails:
+                assert len(User.search({"email": email})) == 1
+            spent = (time.perf_counter() - start) / lookups
+            print("{:>8} users {:<8} {:>10.3f} ms/search".format(
+                size, "index" if indexed else "scan", spent * 1000
+            ))
+    User.__indexes__ = ("email",)
+
+
+def bench_load(sizes: list) -> None:
+    """ Time and trace memory of User.load_from_file, eager and lazy
+    """
+    for size in sizes:
+        populate(size)
+        User.save_to_file()
+        for lazy in (False, True):
+            base.LAZY_LOAD = lazy
+            base.DATA["User"] = {}
+            start = time.perf_counter()
+            User.load_from_file()
+            spent = time.perf_counter() - start
+            base.DATA["User"] = {}
+            tracemalloc.start()
+            User.load_from_file()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print("{:>8} users {:<8} {:>10.3f} s {:>8.1f} MiB".format(
+                size, "lazy" if lazy else "eager", spent, current / 2 ** 20
+            ))
+    base.LAZY_LOAD = False
+
+
+def memory(count: int) -> None:
+    """ Print traced memory of `count` users held in DATA
+    """
+    base.DATA["User"] = {}
+    tracemalloc.start()
+    for i in range(count):
+        user = User(email="user{}@example.com".format(i))
+        user.password = "pwd{}".format(i)
+        base.DATA["User"][user.id] = user
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:>8} users {:<8} {:>10.1f} MiB {:>6.0f} B/user".format(
+        count, "compact" if base.COMPACT else "regular",
+        current / 2 ** 20, current / count
+    ))
+
+
+def bench_memory(sizes: list) -> None:
+    """ Compare memory of regular and compact users, MODELS_COMPACT
+    being read at import each mode runs in its own process
+    """
+    script = os.path.abspath(__file__)
+    for size in sizes:
+        for compact in ("0", "1"):
+            env = dict(os.environ, MODELS_COMPACT=compact)
+            subprocess.run([sys.executable, script, "--memory", str(size)],
+                           env=env, check=True)
+
+
+def bench_to_json(count: int = 100000, rounds: int = 3) -> None:
+    """ Time serializing a `count` users list, as GET /api/v1/users
+    does, with plain strftime and with cached timestamp strings, for
+    each JSON backend installed
+    """
+    populate(count)
+    users = User.all()
+
+    def strftime_json(user: User) -> dict:
+        """ to_json as it was before timestamp strings were cached
+        """
+        result = {}
+        if base.COMPACT:
+            attributes = [(key, getattr(user, key))
+                          for key in user.__fields__ if hasattr(user, key)]
+        else:
+            attributes = user.__dict__.items()
+        for key, value in attributes:
+            if key[0] == '_':
+                continue
+            if isinstance(value, datetime):
+                result[key] = value.strftime(base.TIMESTAMP_FORMAT)
+            else:
+                result[key] = value
+        return result
+
+    runs = {"strftime": strftime_json, "cached": User.to_json}
+    previous = base.JSON_BACKEND
+    for backend in ("json", "orjson", "ujson"):
+        try:
+            base.set_json_backend(backend)
+        except ImportError:
+            continue
+        for name, to_json in runs.items():
+            best = None
+            for _ in range(rounds):
+                start = time.perf_counter()
+                base.JSON_DUMPS([to_json(user) for user in users])
+                spent = time.perf_counter() - start
+                best = spent if best is None else min(best, spent)
+            print("{:>8} users {:<8} {:<6} {:>10.3f} s/list".format(
+                count, name, backend, best
+            ))
+    base.set_json_backend(previous)
+
+
+def bench_post_users(size: int = 10000, posts: int = 200) -> None:
+    """ Time POST /api/v1/users with each persistence mode
+    """
+    os.environ.pop("AUTH_TYPE", None)
+    from api.v1.app import app
+    client = app.test_client()
+    modes = {"rewrite": (False, 0), "journal": (True, 0),
+             "behind": (False, 0.5)}
+    for name, (journal, behind) in modes.items():
+        populate(size)
+        User.save_to_file()
+        base.JOURNAL, base.WRITE_BEHIND = journal, behind
+        start = time.perf_counter()
+        for i in range(posts):
+            client.post("/api/v1/users", json={
+                "email": "post{}@example.com".format(i), "password": "pwd"
+            })
+        spent = time.perf_counter() - start
+        base.flush()
+        print("{:>8} users {:<8} {:>10.1f} POST/s".format(
+            size, name, posts / spent
+        ))
+    base.JOURNAL, base.WRITE_BEHIND = False, 0
+
+
+def bench_threads(size: int = 10000, seconds: float = 3.0,
+                  writers: int = 4, readers: int = 4,
+                  lazy: bool = False) -> None:
+    """ Stress DATA with concurrent writers and readers, report their
+    throughput and check the store, indexes and file stay consistent
+
+    Writers save and remove new users and remove loaded ones, readers
+    list, search and page through users. With `lazy`, users are loaded
+    by a LazyStore so readers build them while writers remove them
+    """
+    populate(size)
+    User.save_to_file()
+    base.LAZY_LOAD = lazy
+    User.load_from_file()
+    loaded = list(dict.keys(base.DATA["User"]))
+    removed = []
+    base.WRITE_BEHIND = 0.1
+    errors = []
+    counts = [0] * (writers + readers)
+    stop = threading.Event()
+
+    def guarded(work):
+        """ Run `work(n)` until stopped, recording what it raises
+        """
+        def run(n: int) -> None:
+            try:
+                while not stop.is_set():
+                    work(n)
+                    counts[n] += 1
+            except Exception as e:
+                errors.append(e)
+        return run
+
+    def writer(n: int) -> None:
+        user = User(email="w{}-{}@example.com".format(n, counts[n]))
+        user.save()
+        if counts[n] % 2:
+            user.remove()
+        elif loaded:
+            old = User.get(loaded.pop())
+            old.remove()
+            removed.append(old.id)
+
+    def reader(n: int) -> None:
+        User.all()
+        User.search({"email": "user1@example.com"})
+        User.search({"first_name": None})
+        cursor = None
+        for _ in range(5):
+            users, cursor = User.page(100, cursor)
+            assert None not in users
+            if cursor is None:
+                break
+
+    threads = [threading.Thread(target=guarded(writer), args=(n,))
+               for n in range(writers)]
+    threads += [threading.Thread(target=guarded(reader), args=(n,))
+                for n in range(writers, writers + readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    base.flush()
+    base.WRITE_BEHIND = 0
+    base.LAZY_LOAD = False
+    indexed = sum(len(ids) for ids in base.INDEXES["User"]["email"].values())
+    with open(".db_User.json") as f:
+        on_file = len(json.load(f))
+    assert not errors, errors
+    assert indexed == User.count() == on_file
+    assert not any(obj_id in base.DATA["User"] for obj_id in removed)
+    print("{:>8} users {:<5} {:>2} writers {:>8.0f} saves/s {:>2} readers "
+          "{:>6.0f} scans/s".format(size, "lazy" if lazy else "eager",
+                                    writers,
+                                    sum(counts[:writers]) / seconds,
+                                    readers,
+                                    sum(counts[writers:]) / seconds))
+
+
+def bench_require_auth(counts: tuple = (10, 100, 1000),
+                       number: int = 2000) -> None:
+    """ Compare per request regex compiling with a `PathMatcher` on
+    exclusion lists of `counts` patterns, half of them wildcards
+    """
+    import re
+    from api.v1.auth.auth import PathMatcher
+
+    def regex_require_auth(path: str, excluded_paths: list) -> bool:
+        """ Auth.require_auth as it was before `PathMatcher`
+        """
+        if path in excluded_paths or path + '/' in excluded_paths:
+            return False
+        for pth in excluded_paths:
+            if pth[-1] == '*' and re.compile(pth[:-1]).match(path):
+                return False
+        return True
+
+    path = "/api/v1/users/me"
+    for count in counts:
+        excluded = ["/api/v1/public{}/".format(i) if i % 2 else
+                    "/api/v1/static{}/*".format(i) for i in range(count)]
+        matcher = PathMatcher(excluded)
+        runs = {
+            "regex": lambda: regex_require_auth(path, excluded),
+            "matcher": lambda: not matcher.match(path),
+        }
+        for name, run in runs.items():
+            secs = timeit.timeit(run, number=number)
+            print("{:>5} paths {:<8} {:>10.2f} us/request".format(
+                count, name, secs / number * 1e6
+            ))
+
+
+def session_worker(store_type: str, sessions: int) -> int:
+    """ Create then resolve `sessions` sessions with a fresh store of
+    `store_type`, return the number of lookups that found their user
+    """
+    from api.v1.auth import session_store
+    os.environ["SESSION_STORE"] = store_type
+    store = session_store.get_session_store()
+    ids = []
+    for i in range(sessions):
+        session_id = "{}-{}".format(os.getpid(), i)
+        store[session_id] = {"user_id": str(i), "created_at": datetime.now()}
+        ids.append(session_id)
+    return sum(1 for session_id in ids if store.get(session_id))
+
+
+def bench_session_store(workers: tuple = (1, 2, 4, 8),
+                        sessions: int = 1000) -> None:
+    """ Time session creation and lookup from `workers` processes on
+    each session store, and how many sessions the parent process sees
+    """
+    from api.v1.auth import session_store
+    for store_type in ("memory", "sqlite"):
+        for count in workers:
+            # A fresh database per run, -wal and -shm files included
+            with tempfile.TemporaryDirectory() as tmp:
+                os.environ["SESSION_STORE"] = store_type
+                os.environ["SESSION_STORE_PATH"] = os.path.join(
+                    tmp, "sessions.sqlite3"
+                )
+                with multiprocessing.Pool(count) as pool:
+                    start = time.perf_counter()
+                    found = pool.starmap(session_worker,
+                                         [(store_type, sessions)] * count)
+                    spent = time.perf_counter() - start
+                assert sum(found) == count * sessions
+                shared = len(session_store.get_session_store())
+            print("{:<8} {:>2} workers {:>10.0f} sessions/s {:>8} "
+                  "shared".format(store_type, count,
+                                  count * sessions / spent, shared))
+    os.environ.pop("SESSION_STORE")
+    os.environ.pop("SESSION_STORE_PATH")
+
+
+def bench_session_sweep(sizes: tuple = (10000, 100000),
+                        expired: int = 1000) -> None:
+    """ Time evicting `expired` dead sessions among `sizes` live ones
+    with a full store scan and with the `SessionExpAuth` expiry heap
+    """
+    from datetime import timedelta
+    from api.v1.auth.session_exp_auth import SessionExpAuth
+    os.environ["SESSION_DURATION"] = "60"
+    auth = SessionExpAuth()
+    store = auth.user_id_by_session_id
+    old = datetime.now() - timedelta(seconds=120)
+
+    def fill(size: int) -> None:
+        """ Store `size` live then `expired` dead sessions
+        """
+        store.clear()
+        auth._expiries.clear()
+        for i in range(size + expired):
+            created_at = datetime.now() if i < size else old
+            sessid = "s{}".format(i)
+            store[sessid] = {"user_id": str(i), "created_at": created_at}
+            auth.track_expiry(sessid, created_at)
+
+    def scan() -> int:
+        """ Evict expired sessions by checking every stored session
+        """
+        now = datetime.now()
+        dead = [sessid for sessid, sess_dct in store.items()
+                if auth.sess_expired(now, sess_dct["created_at"], 60)]
+        for sessid in dead:
+            del store[sessid]
+        return len(dead)
+
+    for size in sizes:
+        for name, sweep in (("scan", scan), ("heap", auth.sweep)):
+            fill(size)
+            start = time.perf_counter()
+            assert sweep() == expired
+            spent = time.perf_counter() - start
+            print("{:>8} live {:<6} {:>10.3f} ms/sweep {:>8} left".format(
+                size, name, spent * 1000, auth.sweep_stats()["live"]
+            ))
+    store.clear()
+    os.environ.pop("SESSION_DURATION")
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--memory"]:
+    memory(int(sys.argv[2]))
+elif __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        bench_writes(sizes)
+        bench_search(sizes)
+        bench_load(sizes)
+        bench_memory(sizes)
+        bench_to_json()
+        bench_post_users()
+        bench_threads()
+        bench_threads(lazy=True)
+        bench_require_auth()
+        bench_session_store()
+        bench_session_sweep()
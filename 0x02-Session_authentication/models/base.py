@@ -1,21 +1,418 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import TypeVar, List, Iterable
-from os import path
+import atexit
+from os import fsync, getenv, path, pread, remove, replace
 import json
+import logging
+from threading import Event, Lock, RLock, Thread
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+# Append-only journal: each save/remove appends one line to
+# `.db_<Class>.journal`, the snapshot is rewritten every JOURNAL_COMPACT
+# lines only
+JOURNAL = getenv("MODELS_JOURNAL", "0") == "1"
+JOURNAL_COMPACT = int(getenv("MODELS_JOURNAL_COMPACT", 10000))
+JOURNAL_SIZES = {}
+# Lazy loading: objects are built from their file record on first access
+LAZY_LOAD = getenv("MODELS_LAZY_LOAD", "0") == "1"
+# Write-behind: save/remove only mark the class dirty, a background thread
+# writes each dirty class at most once every WRITE_BEHIND seconds
+WRITE_BEHIND = float(getenv("MODELS_WRITE_BEHIND", 0))
+FSYNC = getenv("MODELS_FSYNC", "0") == "1"
+DIRTY = set()
+# Writers of a class (save, remove, load and file writes) hold its lock,
+# readers work on atomic copies and never wait: class name -> RLock
+LOCKS = {}
+# Compact objects: `__slots__` instead of `__dict__` and timestamps held
+# as epoch seconds. Decided at import since it shapes the classes
+COMPACT = getenv("MODELS_COMPACT", "0") == "1"
+EPOCH = datetime(1970, 1, 1)
+# JSON encoder of the files, see `set_json_backend`
+JSON_BACKEND = None
+JSON_DUMPS = None
+# Fields emitted by `to_json`: (class, for_serialization) -> ((key,
+# timestamp slot or None), ...), see `Base.serializer`
+SERIALIZERS = {}
+# Secondary indexes: class name -> attribute -> value -> {id: None}
+INDEXES = {}
+# Indexed values each object was saved with: class name -> id -> values
+INDEXED_VALUES = {}
+# Stable ordering used by `page`, built on its first call:
+# class name -> sorted [(created_at string, id)] and class name -> id -> key
+ORDERS = {}
+ORDER_KEYS = {}
+# Change counters, bumped by save/remove: class name -> version and
+# class name -> id -> version. VERSION_EPOCH tells processes apart and
+# LOADS (class name -> loads from file) object versions of each load
+VERSIONS = {}
+OBJECT_VERSIONS = {}
+LOADS = {}
+VERSION_EPOCH = uuid.uuid4().hex[:8]
+
+
+class LazyStore(dict):
+    """ id -> object mapping building objects on first access
+
+    Pending values are either the (offset, length) in bytes of the record
+    in the snapshot file, or the JSON dictionary of a replayed journal
+    record. They are turned into objects by `get`, `[]`, `values`,
+    `items` and `pop`. Once none is left, `values` and `items` are as
+    fast as those of a dict
+    """
+
+    def __init__(self, cls: type, file_path: str = None):
+        """ Initialize a LazyStore of `cls` objects from snapshot
+        `file_path`
+
+        Each record is decoded once, to find where it ends and to take
+        the values of `cls.__indexes__` kept in `indexed` for
+        `build_indexes`. Only its position is held: records are read back
+        when first accessed from the file, kept open until none is left
+        to read so a later rewrite of the snapshot does not move them
+        """
+        super().__init__()
+        self.cls = cls
+        self.indexed = {}
+        self.file = None
+        self.pending_count = 0
+        if file_path is None:
+            return
+        self.file = open(file_path, 'rb')
+        data = self.file.read()
+        text = data.decode('utf-8')
+        ascii = len(text) == len(data)
+        decoder = json.JSONDecoder()
+        attrs = cls.__indexes__
+        end = len(text)
+        char = offset = 0
+        pos = self._skip(text, text.index('{') + 1)
+        while pos < end and text[pos] != '}':
+            key, pos = decoder.raw_decode(text, pos)
+            pos = self._skip(text, self._skip(text, pos) + 1)  # ':'
+            start = pos
+            record, pos = decoder.raw_decode(text, pos)
+            if ascii:
+                offset, length = start, pos - start
+            else:
+                offset += len(text[char:start].encode('utf-8'))
+                length = len(text[start:pos].encode('utf-8'))
+                char = start
+            dict.__setitem__(self, key, (offset, length))
+            self.pending_count += 1
+            if attrs:
+                self.indexed[key] = tuple(record.get(a) for a in attrs)
+            pos = self._skip(text, pos)
+            if text[pos] == ',':
+                pos = self._skip(text, pos + 1)
+
+    @staticmethod
+    def _skip(text: str, pos: int) -> int:
+        """ Return position of next non whitespace character
+        """
+        while pos < len(text) and text[pos] in ' \t\n\r':
+            pos += 1
+        return pos
+
+    @staticmethod
+    def is_raw(value) -> bool:
+        """ Tell if `value` is a pending record rather than an object
+        """
+        return type(value) is tuple or type(value) is dict
+
+    def decode(self, value) -> dict:
+        """ Return the JSON dictionary of pending record `value`,
+        ValueError if the snapshot file was closed meanwhile
+        """
+        if type(value) is tuple:
+            # Read under the lock `_load` closes the file with
+            with self.cls.lock():
+                data = pread(self.file.fileno(), value[1], value[0])
+            return json.loads(data)
+        return value
+
+    def _load(self, key: str, value):
+        """ Return object for `key`, building it from `value` if raw
+
+        The object is stored under the class lock, and only if `key`
+        still holds `value`: a writer may have removed or replaced it
+        meanwhile. None is returned for a record removed meanwhile
+        """
+        if value is None or not self.is_raw(value):
+            return value
+        raw = value
+        try:
+            record = self.decode(raw)
+        except ValueError:
+            if self.file is None or not self.file.closed:
+                raise
+            # Closed once every record was read, this one included
+            return self._load(key, dict.get(self, key))
+        value = self.cls(**record)
+        # Share the values held by the indexes, as eager objects do
+        indexed = INDEXED_VALUES.get(self.cls.__name__, {}).get(key, ())
+        for attr, shared in zip(self.cls.__indexes__, indexed):
+            if getattr(value, attr, None) == shared:
+                setattr(value, attr, shared)
+        with self.cls.lock():
+            current = dict.get(self, key)
+            if current is not raw:
+                # Built by another reader, or changed by a writer
+                return self._load(key, current)
+            dict.__setitem__(self, key, value)
+            self.pending_count -= 1
+            if self.pending_count == 0 and self.file is not None:
+                self.file.close()
+        return value
+
+    def __setitem__(self, key: str, value):
+        """ Store object or pending record `value` under `key`
+        """
+        self.pending_count += (self.is_raw(value) -
+                               self.is_raw(dict.get(self, key)))
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str):
+        """ Remove `key`, KeyError if missing
+        """
+        raw = self.is_raw(dict.__getitem__(self, key))
+        dict.__delitem__(self, key)
+        self.pending_count -= raw
+
+    def __getitem__(self, key: str):
+        """ Return object of `key`, KeyError if missing
+        """
+        value = self._load(key, dict.__getitem__(self, key))
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        """ Return object of `key`, `default` if missing
+        """
+        value = dict.get(self, key)
+        if value is not None:
+            value = self._load(key, value)
+        return default if value is None else value
+
+    def pop(self, key: str, *default):
+        """ Remove and return object of `key`
+        """
+        if not dict.__contains__(self, key):
+            return dict.pop(self, key, *default)
+        value = self._load(key, dict.__getitem__(self, key))
+        del self[key]
+        return value
+
+    def values(self) -> list:
+        """ Return all objects, building pending ones
+        """
+        self.build_pending()
+        return list(dict.values(self))
+
+    def items(self) -> list:
+        """ Return all (id, object) pairs, building pending ones
+        """
+        self.build_pending()
+        return list(dict.items(self))
+
+    def build_pending(self):
+        """ Build every pending record, holding the class lock once for
+        all of them rather than once per record
+        """
+        if self.pending_count == 0:
+            return
+        with self.cls.lock():
+            for key, value in list(dict.items(self)):
+                if self.is_raw(value):
+                    self._load(key, value)
+
+    def pending(self) -> int:
+        """ Number of records not built yet
+        """
+        return self.pending_count
+
+
+def set_json_backend(name: str):
+    """ Select the encoder used to write files: "json", "orjson" or
+    "ujson", the latter two being optional dependencies
+    """
+    global JSON_BACKEND, JSON_DUMPS
+    if name == "json":
+        JSON_DUMPS = json.dumps
+    elif name == "orjson":
+        import orjson
+
+        def JSON_DUMPS(obj) -> str:
+            return orjson.dumps(obj).decode()
+    elif name == "ujson":
+        import ujson
+        JSON_DUMPS = ujson.dumps
+    else:
+        raise ValueError("unknown JSON backend {}".format(name))
+    JSON_BACKEND = name
+
+
+set_json_backend(getenv("MODELS_JSON_BACKEND", "json"))
+
+
+class Timestamp(datetime):
+    """ datetime caching its TIMESTAMP_FORMAT string
+
+    datetimes are immutable, assigning a new timestamp drops the cache
+    with the old value
+    """
+    __slots__ = ("_string",)
+
+    def serialize(self) -> str:
+        """ Return the timestamp formatted with TIMESTAMP_FORMAT
+        """
+        try:
+            return self._string
+        except AttributeError:
+            self._string = self.strftime(TIMESTAMP_FORMAT)
+            return self._string
+
+
+class Flusher(Thread):
+    """ Background thread writing dirty classes every `interval` seconds
+    """
+
+    def __init__(self, interval: float):
+        """ Initialize a daemon Flusher
+        """
+        super().__init__(name="models-flusher", daemon=True)
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        """ Flush until stopped, logging failed writes which are retried
+        on the next round
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                flush()
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "write-behind flush failed, retrying in %ss",
+                    self.interval
+                )
+
+    def stop(self):
+        """ Stop the thread and write what is still dirty
+        """
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        flush()
+
+
+FLUSHER = None
+FLUSHER_LOCK = Lock()
+# Held by `flush`, so one returns only once the writes of others are done
+FLUSH_LOCK = Lock()
+
+
+def mark_dirty(cls: type):
+    """ Schedule a write of `cls` objects, starting the flusher if it is
+    not running
+    """
+    global FLUSHER
+    DIRTY.add(cls)
+    if FLUSHER is not None and FLUSHER.is_alive():
+        return
+    with FLUSHER_LOCK:
+        if FLUSHER is None:
+            atexit.register(stop_flusher)
+        if FLUSHER is None or not FLUSHER.is_alive():
+            FLUSHER = Flusher(WRITE_BEHIND)
+            FLUSHER.start()
+
+
+def stop_flusher():
+    """ Stop the flusher, if started, writing what is still dirty
+    """
+    with FLUSHER_LOCK:
+        flusher = FLUSHER
+    if flusher is not None:
+        flusher.stop()
+
+
+def flush():
+    """ Write every dirty class now, after a flush running in another
+    thread is over
+
+    A class whose write fails is marked dirty again and the error raised
+    once the other classes are written
+    """
+    error = None
+    failed = set()
+    with FLUSH_LOCK:
+        while DIRTY:
+            try:
+                cls = DIRTY.pop()
+            except KeyError:
+                break
+            try:
+                cls.save_to_file()
+            except Exception as e:
+                failed.add(cls)
+                error = e
+        DIRTY.update(failed)
+    if error is not None:
+        raise error
+
+
+def timestamp_string(value) -> str:
+    """ Return a timestamp formatted with TIMESTAMP_FORMAT
+    """
+    if type(value) is Timestamp:
+        return value.serialize()
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+@lru_cache(maxsize=65536)
+def epoch_string(seconds: int) -> str:
+    """ Return epoch `seconds` formatted with TIMESTAMP_FORMAT
+    """
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+
+def epoch_property(slot: str) -> property:
+    """ Property exposing epoch seconds held in `slot` as a datetime
+    """
+    def getter(self) -> datetime:
+        return EPOCH + timedelta(seconds=getattr(self, slot))
+
+    def setter(self, value: datetime):
+        setattr(self, slot, int((value - EPOCH).total_seconds()))
+    return property(getter, setter)
 
 
 class Base():
     """ Base class
     """
 
+    # Attributes looked up by equality in `search` through a hash index
+    __indexes__ = ()
+    # Instance attributes in `to_json` order, used when COMPACT
+    __fields__ = ("id", "created_at", "updated_at")
+    if COMPACT:
+        __slots__ = ("id", "_created_ts", "_updated_ts")
+        created_at = epoch_property("_created_ts")
+        updated_at = epoch_property("_updated_ts")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
@@ -25,15 +422,15 @@ class Base():
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = Timestamp.strptime(kwargs.get('created_at'),
+                                                 TIMESTAMP_FORMAT)
         else:
-            self.created_at = datetime.utcnow()
+            self.created_at = Timestamp.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = Timestamp.strptime(kwargs.get('updated_at'),
+                                                 TIMESTAMP_FORMAT)
         else:
-            self.updated_at = datetime.utcnow()
+            self.updated_at = Timestamp.utcnow()
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -44,62 +441,262 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def serializer(cls, for_serialization: bool = False) -> tuple:
+        """ Return ((key, timestamp slot or None), ...) `to_json` emits
+        for objects of this class, built once per class
+
+        The slot of a timestamp holds epoch seconds in COMPACT objects,
+        it is the key itself in regular ones
+        """
+        fields = SERIALIZERS.get((cls, for_serialization))
+        if fields is None:
+            fields = tuple(
+                (key, ("_{}_ts".format(key[:-3]) if COMPACT else key)
+                 if key in ("created_at", "updated_at") else None)
+                for key in cls.__fields__
+                if for_serialization or key[0] != '_'
+            )
+            SERIALIZERS[(cls, for_serialization)] = fields
+        return fields
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        if COMPACT:
+            for key, slot in self.serializer(for_serialization):
+                if slot is not None:
+                    result[key] = epoch_string(getattr(self, slot))
+                elif hasattr(self, key):
+                    result[key] = getattr(self, key)
+            return result
+        attrs = self.__dict__
+        fields = SERIALIZERS.get((self.__class__, for_serialization)) \
+            or self.serializer(for_serialization)
+        if len(attrs) == len(self.__fields__):
+            try:
+                for key, slot in fields:
+                    value = attrs[key]
+                    if slot is not None:
+                        value = value.serialize() \
+                            if type(value) is Timestamp \
+                            else timestamp_string(value)
+                    result[key] = value
+                return result
+            except KeyError:
+                result = {}
+        # Attributes differing from `__fields__`
+        for key, value in attrs.items():
             if not for_serialization and key[0] == '_':
                 continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
+            result[key] = timestamp_string(value)
         return result
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        with cls.lock():
+            # Fill a new store, readers keep the previous one meanwhile
+            store = LazyStore(cls) if LAZY_LOAD else {}
+            if path.exists(file_path) and LAZY_LOAD:
+                store = LazyStore(cls, file_path)
+            elif path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+                    for obj_id, obj_json in objs_json.items():
+                        store[obj_id] = cls(**obj_json)
+            cls.replay_journal(store)
+            DATA[s_class] = store
+            cls.build_indexes()
+            ORDERS.pop(s_class, None)
+            OBJECT_VERSIONS[s_class] = {}
+            VERSIONS[s_class] = VERSIONS.get(s_class, 0) + 1
+            LOADS[s_class] = LOADS.get(s_class, 0) + 1
+
+    @classmethod
+    def replay_journal(cls, store: dict = None):
+        """ Apply journal records on top of objects loaded in `store`,
+        DATA of the class by default
+
+        Only the last line may be torn, it is then cut off the journal,
+        ValueError is raised for any other unreadable line
+        """
+        if store is None:
+            store = DATA[cls.__name__]
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        JOURNAL_SIZES[s_class] = 0
+        if not path.exists(journal_path):
             return
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        with open(journal_path, 'rb+') as f:
+            lines = f.readlines()
+            end = 0
+            for n, line in enumerate(lines, 1):
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    record = json.loads(line)
+                except ValueError:
+                    if n < len(lines):
+                        raise ValueError("corrupt record line {} of {}"
+                                         .format(n, journal_path))
+                    # Torn last line of an interrupted append, cut so the
+                    # next append starts on a line of its own
+                    f.truncate(end)
+                    break
+                end += len(line)
+                if record.get("obj") is None:
+                    if record.get("id") in store:
+                        del store[record.get("id")]
+                elif LAZY_LOAD:
+                    store[record["id"]] = record["obj"]
+                else:
+                    store[record["id"]] = cls(**record["obj"])
+                JOURNAL_SIZES[s_class] += 1
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to file, emptying the journal
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with cls.lock():
+            s_class = cls.__name__
+            file_path = ".db_{}.json".format(s_class)
+            objs_json = {}
+            for obj_id, obj in list(dict.items(DATA[s_class])):
+                if LazyStore.is_raw(obj):
+                    # Record of a LazyStore never accessed, saved as loaded
+                    objs_json[obj_id] = DATA[s_class].decode(obj)
+                else:
+                    objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            # Write aside then rename so readers never see a torn file
+            tmp_path = "{}.tmp".format(file_path)
+            with open(tmp_path, 'w') as f:
+                f.write(JSON_DUMPS(objs_json))
+                if FSYNC:
+                    f.flush()
+                    fsync(f.fileno())
+            replace(tmp_path, file_path)
+            if JOURNAL_SIZES.get(s_class):
+                remove(".db_{}.journal".format(s_class))
+            JOURNAL_SIZES[s_class] = 0
+
+    @classmethod
+    def append_to_journal(cls, obj_id: str, obj_json: dict = None):
+        """ Append one save (`obj_json`) or remove (None) record
+
+        The snapshot is rewritten once the journal holds JOURNAL_COMPACT
+        records
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        with open(journal_path, 'a') as f:
+            f.write(JSON_DUMPS({"id": obj_id, "obj": obj_json}) + "\n")
+            if FSYNC:
+                f.flush()
+                fsync(f.fileno())
+        JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + 1
+        if JOURNAL_SIZES[s_class] >= JOURNAL_COMPACT:
+            cls.save_to_file()
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__.lock():
+            self.updated_at = Timestamp.utcnow()
+            DATA[s_class][self.id] = self
+            self.__class__.index_object(self)
+            self.__class__.order_object(self)
+            self.__class__.bump_version(self.id)
+            self.__class__.persist(self)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with self.__class__.lock():
+            if DATA[s_class].get(self.id) is not None:
+                del DATA[s_class][self.id]
+                self.__class__.unindex_object(self)
+                self.__class__.unorder_object(self)
+                self.__class__.bump_version(self.id)
+                self.__class__.persist(self, True)
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]):
+        """ Remove objects `objs`, rewriting the file once for all of
+        them when neither WRITE_BEHIND nor JOURNAL is set
+        """
+        s_class = cls.__name__
+        with cls.lock():
+            removed = []
+            for obj in objs:
+                if DATA[s_class].get(obj.id) is not None:
+                    del DATA[s_class][obj.id]
+                    cls.unindex_object(obj)
+                    cls.unorder_object(obj)
+                    cls.bump_version(obj.id)
+                    removed.append(obj)
+            if not removed:
+                return
+            if WRITE_BEHIND > 0:
+                mark_dirty(cls)
+            elif JOURNAL:
+                for obj in removed:
+                    cls.append_to_journal(obj.id)
+            else:
+                cls.save_to_file()
+
+    @classmethod
+    def lock(cls) -> RLock:
+        """ Return the lock held by writers of the class
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, RLock())
+        return lock
+
+    @classmethod
+    def persist(cls, obj: TypeVar('Base'), removed: bool = False):
+        """ Write the change of `obj` the way storage is configured:
+        later (WRITE_BEHIND), to the journal (JOURNAL) or rewriting the
+        whole file
+        """
+        if WRITE_BEHIND > 0:
+            mark_dirty(cls)
+        elif JOURNAL:
+            cls.append_to_journal(obj.id, None if removed else
+                                  obj.to_json(True))
+        else:
+            cls.save_to_file()
+
+    @classmethod
+    def bump_version(cls, obj_id: str):
+        """ Record a change of object `obj_id`
+        """
+        s_class = cls.__name__
+        VERSIONS[s_class] = VERSIONS.get(s_class, 0) + 1
+        versions = OBJECT_VERSIONS.setdefault(s_class, {})
+        versions[obj_id] = versions.get(obj_id, 0) + 1
+
+    @classmethod
+    def version(cls, obj_id: str = None) -> str:
+        """ Return a tag changing whenever objects of the class, or
+        object `obj_id` only, are saved or removed
+        """
+        s_class = cls.__name__
+        if obj_id is None:
+            return "{}-{}".format(VERSION_EPOCH, VERSIONS.get(s_class, 0))
+        return "{}-{}-{}-{}".format(
+            VERSION_EPOCH, LOADS.get(s_class, 0), obj_id,
+            OBJECT_VERSIONS.get(s_class, {}).get(obj_id, 0)
+        )
 
     @classmethod
     def count(cls) -> int:
@@ -121,9 +718,187 @@ class Base():
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @classmethod
+    def build_indexes(cls):
+        """ Rebuild secondary indexes from loaded objects
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.__indexes__}
+        INDEXED_VALUES[s_class] = {}
+        if not cls.__indexes__:
+            return
+        indexed = getattr(DATA[s_class], "indexed", {})
+        for obj_id, obj in dict.items(DATA[s_class]):
+            if type(obj) is tuple and obj_id in indexed:
+                # Values taken when the LazyStore decoded the snapshot
+                values = indexed[obj_id]
+            elif LazyStore.is_raw(obj):
+                # Not built yet record of a LazyStore
+                record = DATA[s_class].decode(obj)
+                values = tuple(record.get(attr) for attr in cls.__indexes__)
+            else:
+                values = tuple(getattr(obj, attr, None)
+                               for attr in cls.__indexes__)
+            cls.index_values(obj_id, values)
+        if indexed:
+            DATA[s_class].indexed = {}
+
+    @classmethod
+    def index_object(cls, obj: TypeVar('Base')):
+        """ Index `obj` by its current values, dropping previous ones
+        """
+        if not cls.__indexes__:
+            return
+        s_class = cls.__name__
+        if s_class not in INDEXES:
+            cls.build_indexes()
+        cls.unindex_object(obj)
+        cls.index_values(obj.id, tuple(getattr(obj, attr, None)
+                                       for attr in cls.__indexes__))
+
+    @classmethod
+    def index_values(cls, obj_id: str, values: tuple):
+        """ Add `obj_id` to secondary indexes under `values`
+        """
+        s_class = cls.__name__
+        for attr, value in zip(cls.__indexes__, values):
+            INDEXES[s_class][attr].setdefault(value, {})[obj_id] = None
+        INDEXED_VALUES[s_class][obj_id] = values
+
+    @classmethod
+    def unindex_object(cls, obj: TypeVar('Base')):
+        """ Remove `obj` from secondary indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj.id, None)
+        if values is None:
+            return
+        for attr, value in zip(cls.__indexes__, values):
+            ids = INDEXES[s_class][attr].get(value)
+            if ids is not None:
+                ids.pop(obj.id, None)
+                if not ids:
+                    del INDEXES[s_class][attr][value]
+
+    @classmethod
+    def build_order(cls) -> list:
+        """ Build the (created_at, id) ordering of loaded objects
+        """
+        s_class = cls.__name__
+        with cls.lock():
+            return cls._build_order(s_class)
+
+    @classmethod
+    def _build_order(cls, s_class: str) -> list:
+        """ Build the ordering, the class lock being held
+        """
+        keys = {}
+        for obj_id, obj in dict.items(DATA[s_class]):
+            if LazyStore.is_raw(obj):
+                created = DATA[s_class].decode(obj).get("created_at")
+            else:
+                created = timestamp_string(obj.created_at)
+            keys[obj_id] = (created, obj_id)
+        ORDER_KEYS[s_class] = keys
+        ORDERS[s_class] = sorted(keys.values())
+        return ORDERS[s_class]
+
+    @classmethod
+    def order_object(cls, obj: TypeVar('Base')):
+        """ Insert `obj` in the ordering, if built and not there yet
+        """
+        s_class = cls.__name__
+        if s_class not in ORDERS or obj.id in ORDER_KEYS[s_class]:
+            return
+        key = (timestamp_string(obj.created_at), obj.id)
+        ORDER_KEYS[s_class][obj.id] = key
+        insort(ORDERS[s_class], key)
+
+    @classmethod
+    def unorder_object(cls, obj: TypeVar('Base')):
+        """ Remove `obj` from the ordering, if built
+        """
+        s_class = cls.__name__
+        key = ORDER_KEYS.get(s_class, {}).pop(obj.id, None)
+        if key is None:
+            return
+        order = ORDERS[s_class]
+        pos = bisect_right(order, key) - 1
+        if pos >= 0 and order[pos] == key:
+            del order[pos]
+
+    @staticmethod
+    def encode_cursor(key: tuple) -> str:
+        """ Return opaque cursor of an ordering key
+        """
+        return urlsafe_b64encode("|".join(key).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """ Return ordering key of a cursor, ValueError if malformed
+        """
+        try:
+            created, obj_id = urlsafe_b64decode(
+                cursor.encode()).decode().split("|")
+        except Exception:
+            raise ValueError("invalid cursor")
+        return (created, obj_id)
+
+    @classmethod
+    def page(
+        cls,
+        limit: int,
+        cursor: str = None,
+        attributes: dict = {}
+    ) -> tuple:
+        """ Return up to `limit` objects matching `attributes` in
+        (created_at, id) order, after `cursor` if given, and the cursor
+        of the next page (None on the last one)
+
+        Candidates come from `id` or a secondary index when one of
+        `attributes` is indexed, otherwise the ordering is walked from
+        `cursor`
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class)
+        if order is None:
+            order = cls.build_order()
+        order_keys = ORDER_KEYS[s_class]
+        after = cls.decode_cursor(cursor) if cursor else None
+        if "id" in attributes or any(attr in attributes
+                                     for attr in cls.__indexes__):
+            keys = [order_keys.get(obj.id) for obj in cls.search(attributes)]
+            keys = sorted(key for key in keys if key is not None)
+            start = bisect_right(keys, after) if after else 0
+            keys = keys[start:start + limit + 1]
+        else:
+            # Copied at once so writers may go on while walking it
+            order = list(order)
+            start = bisect_right(order, after) if after else 0
+            keys = []
+            for i in range(start, len(order)):
+                key = order[i]
+                obj = DATA[s_class].get(key[1])
+                if obj is None or any(getattr(obj, k, None) != v
+                                      for k, v in attributes.items()):
+                    continue
+                keys.append(key)
+                if len(keys) > limit:
+                    break
+        next_cursor = None
+        if len(keys) > limit:
+            keys = keys[:limit]
+            next_cursor = cls.encode_cursor(keys[-1])
+        objs = [DATA[s_class].get(key[1]) for key in keys]
+        return ([obj for obj in objs if obj is not None], next_cursor)
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Candidates come from the id when `attributes` has one, from a
+        secondary index when one of them is in `__indexes__`, from a full
+        scan otherwise
         """
         s_class = cls.__name__
         def _search(obj):
@@ -134,4 +909,28 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        candidates = None
+        if "id" in attributes:
+            try:
+                obj = DATA[s_class].get(attributes["id"])
+            except TypeError:
+                # Unhashable value, can not be an id
+                obj = None
+            candidates = [] if obj is None else [obj]
+        else:
+            for attr in cls.__indexes__:
+                if attr in attributes and s_class in INDEXES:
+                    try:
+                        ids = INDEXES[s_class][attr].get(attributes[attr],
+                                                         {})
+                    except TypeError:
+                        # Unhashable value, can not be in the index
+                        break
+                    candidates = [DATA[s_class].get(i) for i in list(ids)]
+                    candidates = [obj for obj in candidates
+                                  if obj is not None]
+                    break
+        if candidates is None:
+            # Copied at once so writers may go on while filtering
+            candidates = list(DATA[s_class].values())
+        return list(filter(_search, candidates))
@@ -2,13 +2,20 @@
 """ User module
 """
 import hashlib
-from models.base import Base
+from models.base import Base, COMPACT
 
 
 class User(Base):
     """ User class
     """
 
+    __indexes__ = ("email",)
+    __fields__ = Base.__fields__ + (
+        "email", "_password", "first_name", "last_name"
+    )
+    if COMPACT:
+        __slots__ = __fields__[len(Base.__fields__):]
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """Module defines `UserSession` class"""
-from models.base import Base
+from models.base import Base, COMPACT
 
 
 class UserSession(Base):
     """Base docstring for UserSession."""
+
+    __indexes__ = ("session_id",)
+    __fields__ = Base.__fields__ + ("user_id", "session_id")
+    if COMPACT:
+        __slots__ = __fields__[len(Base.__fields__):]
+
     def __init__(self, *args: list, **kwargs: dict):
         super(UserSession, self).__init__(*args, **kwargs)
         if kwargs.get("user_id") is not None: